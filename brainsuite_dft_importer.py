@@ -44,49 +44,76 @@ verbose = True
 #       don't edit beyond here        #
 #######################################
 
+import bmesh
 import bpy
+import numpy as np
 
 
 def main():
 
-    # if there's already a nurbs circle in existence, it could cause problems
-    if bpy.data.objects.get('NurbsCircle') is not None:
-        print("WARNING: A 'NurbsCircle' object already existed!"
-              "The script will use that instead of generating a new one... "
-              "I hope that's what you wanted.")
-
     # start timer
     if verbose:
         import time
         tic = time.time()
 
-    curves, colors = dft_read(dft_file)
+    # everything which is the same for all of the tubes is made only once
+    bevel_obj, material = setup_curve_env(radius=radius,
+                                          res_circum=res_circum,
+                                          auto_color=auto_color)
+
+    # only every (curve_step)-th curve is read in, and only every
+    # (vertex_step)-th vertex of those
+    points, offsets, colors = dft_read(dft_file, curve_step=curve_step,
+                                       vertex_step=vertex_step)
 
-    # initiate list of curves, used at the end to move them all to
-    # the global origin
-    curve_list = []
+    # move the brain near the global origin before importing it, by moving
+    # all curves based on 1st curve's displacement (ie its center of mass)
+    # from origin.  This is done in place on the vertex array.
+    if center_curves and len(offsets) > 1:
+        points -= points[offsets[0]:offsets[1]].mean(axis=0)
 
-    num_curves = len(curves)
+    num_curves = len(offsets) - 1
 
-    # loop through all curves, but only create the curve in Blender for
-    # every (curve_step)-th curve.
+    # initiate list of curves
+    curve_list = [None]*num_curves
+
+    # loop through all curves and create each one in Blender
     for i in range(num_curves):
-        if i % curve_step == 0:
-            verts = curves[i][::vertex_step, :]
-            color = colors[i]
-            curve = make_curve(verts, radius=radius, res_length=res_length,
-                               res_circum=res_circum,
-                               color=color, auto_color=auto_color)
-            curve_list.append(curve)
-            if verbose:
-                print("Finished curve " + str(i) + "/" + str(num_curves))
-
-    # after the brain is imported, move it near the global origin
-    if center_curves:
-        # Move all curves based on 1st curve's displacement from origin
-        trans_vector = -curve_list[0].location
+        verts = points[offsets[i]:offsets[i+1]]
+        color = colors[i]
+        curve = make_curve(verts, bevel_obj, res_length=res_length,
+                           color=color, auto_color=auto_color,
+                           material=material)
+        curve_list[i] = curve
+        # printing is slow in Blender's console, so only report progress
+        # every 100 curves
+        if verbose and ((i+1) % 100 == 0 or i+1 == num_curves):
+            print("Finished curve " + str(i+1) + "/" + str(num_curves))
+
+    # (there's nothing to do if no curves were read)
+    if curve_list:
+        # link all of the tubes to the scene in one pass, now that they've all
+        # been built, and select all of them (and only them), so that the
+        # conversion below is only run once for all of the tubes
+        scn = bpy.context.scene
+        for obj in bpy.context.selected_objects:
+            obj.select = False
         for curve in curve_list:
-            curve.location += trans_vector
+            scn.objects.link(curve)
+            curve.select = True
+        scn.objects.active = curve_list[0]
+
+        # In order to use the auto color, we have to convert the curves to
+        # meshes
+        if auto_color:
+            bpy.ops.object.convert(target='MESH')
+            for curve in curve_list:
+                # sometimes this conversion results in a bunch of doubles,
+                # so I remove the doubles
+                remove_doubles(curve)
+
+                # color the curve
+                color_tube(curve)
 
     print("Done")
     if verbose:
@@ -94,110 +121,157 @@ def main():
         print("That took", toc-tic, "seconds.")
 
 
-def dft_read(dft_filename, verbose=False):
+def dft_read(dft_filename, verbose=False, curve_step=1, vertex_step=1):
     """Simple reader for BrainSuite's .dft files.
 
     This reads a .dft file and outputs a the vertices corresponding to the
-    curves and the color of each curve.
+    curves and the color of each curve.  The vertices of all the curves are
+    returned together in one array, along with the offset of each curve's
+    first vertex in it.
 
     Note: if using Python 2, you must do
     "from __future__ import print_function" before calling this function.
 
     EXAMPLE USAGE
-        list_curves, list_colors = dft_read("subj1_curves.dft")
+        points, offsets, list_colors = dft_read("subj1_curves.dft")
+        # the n-th curve is then
+        curve = points[offsets[n]:offsets[n+1]]
+        # or, for every 5th curve with every 2nd vertex of each:
+        points, offsets, list_colors = dft_read("subj1_curves.dft",
+                                                curve_step=5, vertex_step=2)
 
     INPUT:
         > dft_filename: string of the file to be read.
         > verbose: Boolean, set to True if you want verbose output
+        > curve_step: integer, only every (curve_step)-th curve is returned.
+            The vertices of the skipped curves aren't decoded at all.
+        > vertex_step: integer, only every (vertex_step)-th vertex of each
+            curve is returned.
 
     OUTPUT:
-        > list_curves: list with each element representing one curve using a
-            (N x 3) NumPy array where each row is a vertex.
+        > points: (N x 3) NumPy array where each row is a vertex, holding
+            the vertices of all the curves one after another.
+        > offsets: NumPy array of ints with one more element than there are
+            curves, so that the n-th curve is points[offsets[n]:offsets[n+1]]
         > list_color: list where n-th element is the a 3-element list of ints
             in the form [R,G,B] corresponding to color of the n-th curve"""
+    import re
     import struct
-    import xml.etree.ElementTree as ET
     import numpy as np
 
-    # list of curves to return,
-    list_curves = []
-
     # if verbose is set, we'll time how long it takes to finish
     if verbose:
         import time
         tic = time.time()
 
-    # open the file to be read in binary mode
+    # read the whole file into memory in one go, then parse it by offset.
+    # This avoids a separate (small) file read for every header field and
+    # every curve.
     with open(dft_filename, "rb") as fo:
+        raw = fo.read()
+
+    # the fixed-size header, decoded in one go:
+    #   label: 8 byte text label for the file version (unused for now)
+    #   version: 4 byte version code (unused)
+    #   hdrsize: the header size
+    #   dataStart: start of data of the curve vertices
+    #   mdoffset: start of XML data which gives the color of each curve
+    #   pdoffset: unused, since I'm not sure what it does
+    #   nContours: number of curves (an unsigned int32)
+    hdr_dtype = np.dtype([('label', 'S8'), ('version', 'S4'),
+                          ('hdrsize', '<i4'), ('dataStart', '<i4'),
+                          ('mdoffset', '<i4'), ('pdoffset', '<i4'),
+                          ('nContours', '<u4')])
+    hdr = np.frombuffer(raw, hdr_dtype, count=1)[0]
+
+    dataStart = int(hdr['dataStart'])
+    mdoffset = int(hdr['mdoffset'])
+    nContours = int(hdr['nContours'])
 
-        # for now, I just discard the first 8 bytes which are the text label
-        # for the file version
-        _ = fo.read(8)[0]
-        # discard the next 4 bytes corresponding to the version code.
-        _ = fo.read(4)[0]
-        # read in as an integer the header size  (4 bytes)
-        hdrsize = struct.unpack('i', fo.read(4))[0]
-        # start of data of the curve vertices
-        dataStart = struct.unpack('i', fo.read(4))[0]
-        # start of XML data which gives the color of each curve
-        mdoffset = struct.unpack('i', fo.read(4))[0]
-        # Discard the next 4 bytes ("pdoffset") since I'm not sure what they do
-        _ = struct.unpack('i', fo.read(4))[0]
-        # Number of curves (read in as an unsigned int32)
-        nContours = struct.unpack('I', fo.read(4))[0]
-
-        if verbose:
-            print("the number of curves is: ", nContours)
-
-        # move current file reading position to start of xml block
-        fo.seek(mdoffset)
-
-        # calculate size of the XML block
-        xml_block_size = dataStart - mdoffset
-        # read in XML block
-        xml_block = fo.read(xml_block_size)
-
-        # get root element of XML block
-        root = ET.fromstring(xml_block)
-        # list of all the colors.  Each color is represented by a
-        # list of 3 elements corresponding to RGB.
-        list_colors = []
-
-        for child in root:
-            temp_color = child.attrib['color']
-            # convert to float
-            temp_color = [float(x) for x in temp_color.split(" ")]
-            list_colors.append(temp_color)
-
-        # move current file reading position to start of curve vertex data
-        fo.seek(dataStart)
-
-        # loop through every curve
-        for curve in range(nContours):
-            # number of points in current curve
-            num_points = struct.unpack('i', fo.read(4))[0]
-
-            if verbose:
-                print("Number of points in current curve:", num_points)
-
-            # in order to read off all the points of a curve in one fell swoop,
-            # we need to know the number of (4 byte) floats to read off
-            num_floats = num_points*3
-            points = struct.unpack('f'*num_floats, fo.read(4*num_floats))
-
-            # make NumPy array from the points.  We reshape it to be a
-            # Nx3 array.
-            points_arr = np.array(points).reshape((-1, 3))
-
-            # add to the list of curves
-            list_curves.append(points_arr)
-
-        if verbose:
-            toc = time.time()
-            print("Finished processing", nContours,
-                  "curves in", toc-tic, "seconds.")
-
-        return list_curves, list_colors
+    if verbose:
+        print("the number of curves is: ", nContours)
+
+    # the XML block sits between mdoffset and the start of the curve data
+    xml_block = raw[mdoffset:dataStart]
+
+    # pull the "R G B" color attribute of every curve out of the XML.  Any
+    # comments are dropped first, and so is the root element's start tag,
+    # since only the curve elements inside it carry the colors.
+    xml_body = re.sub(br'<!--.*?-->', b'', xml_block, flags=re.DOTALL)
+    root_start = re.search(br'<[A-Za-z_][^>]*>', xml_body)
+    xml_body = xml_body[root_start.end():] if root_start else b''
+    color_strs = [match.group(2) for match in re.finditer(
+        br'\scolor\s*=\s*(["\'])(.*?)\1', xml_body)]
+
+    # there must be exactly one color per curve, otherwise the colors
+    # would silently be shifted onto the wrong curves
+    if len(color_strs) != nContours:
+        raise ValueError("Found " + str(len(color_strs)) + " curve colors "
+                         "in the XML block, but the header says there are " +
+                         str(nContours) + " curves.")
+
+    # keep every (curve_step)-th color ...
+    color_strs = color_strs[::curve_step]
+    # ... and convert them all to floats in one go, one row per curve, so
+    # that a color without exactly 3 values can't spill over into the next
+    # curve's color
+    try:
+        colors = np.array([color_str.split() for color_str in color_strs],
+                          dtype=float)
+    except ValueError:
+        colors = None
+    if colors is None or (color_strs and
+                          colors.shape != (len(color_strs), 3)):
+        raise ValueError("Every curve color in the XML block must have "
+                         "exactly 3 values (R G B).")
+    # list of all the colors.  Each color is represented by a
+    # list of 3 elements corresponding to RGB.
+    list_colors = colors.reshape((-1, 3)).tolist()
+
+    # Each curve is stored as an int32 number of points followed by that
+    # many (x, y, z) float32 triplets.  First we hop along the point counts
+    # only (the position of the next count depends on the current one) ...
+    unpack_count = struct.Struct('<i').unpack_from  # reads in place, no copy
+    num_points = [0]*nContours
+    offset = dataStart
+    for curve in range(nContours):
+        # number of points in current curve
+        n = unpack_count(raw, offset)[0]
+        num_points[curve] = n
+        offset += 4 + 12*n
+
+        # (only every 100th curve, since printing is slow)
+        if verbose and curve % 100 == 0:
+            print("Number of points in curve " + str(curve) + ":", n)
+
+    # ... then compute where each curve's vertices start (just after its
+    # point count) ...
+    num_points = np.array(num_points, dtype=np.int64)
+    starts = dataStart + np.cumsum(4 + 12*num_points) - 12*num_points
+
+    # ... then work out how many vertices are kept from every
+    # (curve_step)-th curve (every (vertex_step)-th vertex) and where each
+    # of those curves starts in the array of all kept vertices ...
+    kept_num_points = num_points[::curve_step]
+    kept_starts = starts[::curve_step]
+    num_kept_points = (kept_num_points + vertex_step - 1) // vertex_step
+    offsets = np.zeros(len(num_kept_points) + 1, dtype=int)
+    np.cumsum(num_kept_points, out=offsets[1:])
+
+    # ... and copy each of those curves' vertices from the file buffer
+    # straight into that (preallocated) array.
+    points = np.empty((offsets[-1], 3), dtype=np.float32)
+    for i in range(len(kept_num_points)):
+        points[offsets[i]:offsets[i+1]] = np.frombuffer(
+            raw, '<f4', count=3*int(kept_num_points[i]),
+            offset=int(kept_starts[i])).reshape((-1, 3))[::vertex_step]
+
+    if verbose:
+        toc = time.time()
+        print("Finished processing", nContours,
+              "curves in", toc-tic, "seconds.")
+
+    return points, offsets, list_colors
 
 
 def color_tube(obj):
@@ -217,44 +291,51 @@ def color_tube(obj):
     if len(mesh.vertex_colors) == 0:
         bpy.ops.mesh.vertex_color_add()
 
-    # for each polygon calculate the direction then assign
-    # that direction to the four vertices (only doing it for rectangles).
-    # This will create some redundancy,
-    # so we average later on.
-    # First, create a list of N empty lists, where N is the number vertices
-    all_vert_colors = [list([]) for _ in range(num_verts)]
-    for poly in mesh.polygons:
-        if len(poly.vertices) == 4:
-            direction = long_edge_dir(mesh, poly)
-            # make all elements of direction positive
-            pos_direction = [abs(k) for k in direction]
-            # scale this so that one of the three values is 1.0.
-            # I'm not sure if this is the most sensible operation to perform...
-            face_color = [k / max(pos_direction) for k in pos_direction]
-            # save this color to the 4 vertices
-            for vert in poly.vertices:
-                all_vert_colors[vert].append(face_color)
-
-    # now we loop through again to average out the color at each vertex
-    # initialize the list of vertex colors
-    final_vert_colors = [0]*num_verts
-
-    for vert in range(num_verts):
-        # print("vert=",vert)
-        final_vert_colors[vert] = average_color(all_vert_colors[vert])
-
-    i = 0
-    for poly in mesh.polygons:
-        for vert_side in poly.loop_indices:
-            # find the vertex number as indexed by mesh.vertices,
-            # ie. where each vertex has 1 unique number
-            global_vert_num = poly.vertices[vert_side-min(poly.loop_indices)]
-
-            mesh.vertex_colors[0].data[i].color = final_vert_colors[
-                global_vert_num
-                ]
-
-            i += 1
+    # pull the vertex coordinates and the polygons' vertex indices into NumPy
+    # arrays so that all of the polygons can be processed at once.
+    coords = np.empty(num_verts*3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coords)
+    coords = coords.reshape((-1, 3))
+
+    num_polys = len(mesh.polygons)
+    loop_starts = np.empty(num_polys, dtype=np.int32)
+    loop_totals = np.empty(num_polys, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loop_starts)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_verts)
+
+    # (nquads x 4) array of the vertices of each rectangle (the triangles on
+    # the caps are skipped)
+    quad_starts = loop_starts[loop_totals == 4]
+    quads = loop_verts[quad_starts[:, None] + np.arange(4)]
+
+    direction = long_edge_dirs(coords, quads)
+
+    # make all elements of direction positive
+    pos_direction = np.abs(direction)
+    # scale this so that one of the three values is 1.0.
+    # I'm not sure if this is the most sensible operation to perform...
+    face_color = pos_direction / pos_direction.max(axis=1)[:, None]
+
+    # assign each face's color to its four vertices.  This creates some
+    # redundancy, so the colors are summed up at each vertex and then
+    # averaged.  Vertices which aren't on any rectangle are left black.
+    # (np.bincount sums the contributions in one sequential pass, which is
+    # much faster than the scattered writes of np.add.at)
+    quad_verts = quads.ravel()
+    vert_face_colors = np.repeat(face_color, 4, axis=0)
+    sums = np.column_stack([np.bincount(quad_verts,
+                                        weights=vert_face_colors[:, k],
+                                        minlength=num_verts)
+                            for k in range(3)])
+    counts = np.bincount(quad_verts, minlength=num_verts)
+    final_vert_colors = sums / np.maximum(counts, 1)[:, None]
+
+    # give every loop (ie. each corner of each polygon) the color of its
+    # vertex, and write them all to the vertex color layer in one go
+    loop_colors = final_vert_colors[loop_verts].astype(np.float32)
+    mesh.vertex_colors[0].data.foreach_set('color', loop_colors.ravel())
 
 
 def make_material(name, diffuse_color=(1.0, 1.0, 1.0), diffuse_intensity=0.8,
@@ -267,70 +348,119 @@ def make_material(name, diffuse_color=(1.0, 1.0, 1.0), diffuse_intensity=0.8,
     return mat
 
 
-def long_edge_dir(mesh, poly):
-    """Given a rectangular polygon,
-    it finds the direction of the longest edge"""
-
-    # we now search through the 4 edge vectors, we record max length,
-    # and also min length to make sure the rectangle is not too square
-    current_max_length = 0.0
-    # the value -99 just indicates that this variable hasn't been set yet.
-    current_min_length = -99.0
-    for edge in poly.edge_keys:
-        # get the edge vector
-        edge_vec = mesh.vertices[edge[0]].co - mesh.vertices[edge[1]].co
-        length = edge_vec.length
-
-        if length > current_max_length:
-            direction = edge_vec
-            current_max_length = length
-        if length < current_min_length or current_min_length == -99.0:
-            current_min_length = length
-
-    # give warning for very square rectangles
-    if (current_max_length - current_min_length) / current_min_length < 0.02:
-        print("WARNGING: your rectangle is pretty square! Short side:",
-              current_min_length, "and long side:", current_max_length)
+def long_edge_dirs(coords, quads):
+    """Given the (N x 3) vertex coordinates of a mesh and an (M x 4) array of
+    the vertices of its rectangles, it finds the direction of the longest
+    edge of each rectangle (as an (M x 3) array)"""
+
+    # the 4 edge vectors of every rectangle
+    edges = coords[quads[:, [1, 2, 3, 0]]] - coords[quads]
+    # squared lengths are enough to find the longest edge
+    sq_lengths = np.einsum('ijk,ijk->ij', edges, edges)
+    longest = sq_lengths.argmax(axis=1)
+    rows = np.arange(len(quads))
+
+    # we also record the min length to make sure the rectangles are not too
+    # square, and give a warning for very square ones
+    max_lengths = np.sqrt(sq_lengths[rows, longest])
+    min_lengths = np.sqrt(sq_lengths.min(axis=1))
+    num_square = np.count_nonzero(
+        (max_lengths - min_lengths) / min_lengths < 0.02)
+    if num_square > 0:
+        print("WARNING:", num_square, "of your rectangles are pretty square!")
         print("This could lead to incorrect coloring")
         print("if you're using the brainsuite to blender dft importer, "
               "try increasing res_circum")
 
-    return direction
+    return edges[rows, longest]
 
 
-def average_color(list_of_colors):
-    """given a list of colors (which themselves are 3 element lists, [R,G,B]),
-    give the average color"""
-    # initialize average color
-    average_color = [0, 0, 0]
+def remove_doubles(obj, dist=0.0001):
+    """ Removes doubles, by default with the same merge distance as Blender's
+    remove doubles operator.  This is done directly on the mesh data with
+    bmesh, so without going through edit mode."""
+    mesh = obj.data
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=dist)
+    bm.to_mesh(mesh)
+    bm.free()
+    mesh.update()
 
-    num = len(list_of_colors)
 
-    for color_j in range(3):
-        average_color[color_j] = sum(
-            [list_of_colors[i][color_j] for i in range(num)]
-            ) / num
+def make_bevel_object(radius=0.5, res_circum=3):
+    """ Returns the NURBS circle used as the bevel object, which gives the
+    tubes their width, creating it if need be.
 
-    return average_color
+    >INPUT:
+        radius: radius of the tubes
+        res_circum: the resolution around the circumference of tube
+    """
+    # if there's already a nurbs circle in existence, it could cause problems
+    if bpy.data.objects.get('NurbsCircle') is None:
+        # Create the bevel object to give tube some width
+        bpy.ops.curve.primitive_nurbs_circle_add(radius=radius)
+        bevel_obj = bpy.data.objects['NurbsCircle']
+        bevel_obj.data.resolution_u = res_circum
+        # make this object invisible
+        # (it would probably be better to delete it at the end...)
+        bevel_obj.hide = True
+        bevel_obj.hide_render = True
+    else:
+        bevel_obj = bpy.data.objects['NurbsCircle']
 
+    return bevel_obj
 
-def remove_doubles(obj):
-    """ Removes doubles using default settings"""
-    bpy.ops.object.mode_set(mode='EDIT')
-    # toggle select_all since objects are created with all vertices deselected
-    bpy.ops.mesh.select_all(action='TOGGLE')
-    bpy.ops.mesh.remove_doubles()
-    bpy.ops.object.mode_set(mode='OBJECT')
 
+def setup_curve_env(radius=0.5, res_circum=3, auto_color=False):
+    """ Makes the things which are shared by all of the tubes, and so only
+    need to be made once before calling make_curve.
 
-def make_curve(verts, radius=0.5, spline_type='NURBS', res_length=5,
-               res_circum=3, color=None, auto_color=False, curve_name='tract',
-               curvedata_name='curve_data'):
+    >INPUT:
+        radius: radius of the tubes
+        res_circum: the resolution around the circumference of tube
+        auto_color: whether the tubes will be colored according to their
+                    direction
+
+    >OUTPUT:
+        bevel_obj: the curve object giving the tubes their cross section
+        material: with auto_color, the material shared by all of the tubes
+                  (which gets its colors from each tube's vertex colors),
+                  otherwise None
+    """
+    # if there's already a nurbs circle in existence, it could cause problems
+    if bpy.data.objects.get('NurbsCircle') is not None:
+        print("WARNING: A 'NurbsCircle' object already existed!"
+              "The script will use that instead of generating a new one... "
+              "I hope that's what you wanted.")
+
+    bevel_obj = make_bevel_object(radius=radius, res_circum=res_circum)
+
+    if auto_color:
+        material = make_material('curve_material',
+                                 diffuse_color=(0.8, 0.8, 0.8))
+        material.use_vertex_color_paint = True
+    else:
+        material = None
+
+    return bevel_obj, material
+
+
+def make_curve(verts, bevel_obj, spline_type='NURBS', res_length=5,
+               color=None, auto_color=False, material=None,
+               curve_name='tract', curvedata_name='curve_data'):
     """ Given a list of vertices, this creates a tube-like object
     following the vertices.
 
+    The object's origin is put at the center of mass of the vertices.
+    Linking the tube to the scene and (for auto_color) converting it to a
+    mesh and coloring it are left to the caller, so that these can be done
+    once for all of the tubes.
+
     >INPUT:
         verts: Nx3 NumPy array where N is the number of vertices
+        bevel_obj: the curve object giving the tube's cross section (see
+                   setup_curve_env)
         spline_type: 'POLY' or 'NURBS'
         color: there are 2 options, leave is as None or give it
         a color [R, G, B].  If auto_color is set, this argument is ignored
@@ -338,38 +468,30 @@ def make_curve(verts, radius=0.5, spline_type='NURBS', res_length=5,
                     auto_color and colors get a bit funky, then it's because
                     rectangles aren't long enough.  Turn this down or
                     increase res_cross_section.
-        res_circum: the resolution around the circumference of tube
         auto_color: color the curve according to its direction, R,G,B for
                     x,y,z-directions.
-                    Setting this also converts it from NURBS/poly curve to mesh
+                    The caller must convert the curve to a mesh and color it
+        material: a material to share between tubes (see setup_curve_env).
+                  If given, color is ignored, otherwise a new material is
+                  made for this tube.
     """
-    scn = bpy.context.scene
-
     curve_data = bpy.data.curves.new(name=curvedata_name, type='CURVE')
     curve_data.dimensions = '3D'
     # fill in the end caps
     curve_data.use_fill_caps = True
 
-    # if there's already a bezier circle in existence, it could cause problems
-    if bpy.data.objects.get('NurbsCircle') is None:
-        # Create the bevel object to give tube some width
-        bpy.ops.curve.primitive_nurbs_circle_add(radius=radius)
-        bevel_obj = bpy.data.objects['NurbsCircle']
-        bevel_obj.data.resolution_u = res_circum
-        # make this object invisible
-        # (it would probably be better to delete it at the end...)
-        bevel_obj.hide = True
-        bevel_obj.hide_render = True
-    else:
-        bevel_obj = bpy.data.objects['NurbsCircle']
-
     curve_data.bevel_object = bevel_obj
 
     curve = bpy.data.objects.new(curve_name, curve_data)
 
-    # create a material for curve
-    if color is None or auto_color is True:
+    # create a material for curve, unless we were given one
+    if material is not None:
+        mat = material
+    elif color is None or auto_color is True:
         mat = make_material('curve_material', diffuse_color=(0.8, 0.8, 0.8))
+        # with auto_color, the tube gets its colors from its vertex colors
+        if auto_color:
+            mat.use_vertex_color_paint = True
     elif type(color) == list and len(color) == 3:
         mat = make_material('curve_material', color)
     else:
@@ -378,53 +500,35 @@ def make_curve(verts, radius=0.5, spline_type='NURBS', res_length=5,
     # set curve to have this material
     curve.active_material = mat
 
-    # link the object to the scene
-    scn.objects.link(curve)
-
     # create the curve
     spline = curve_data.splines.new(spline_type)
 
+    # put the object's origin at the center of mass of the vertices, so the
+    # control points are relative to it
+    centroid = verts.mean(axis=0)
+    curve.location = tuple(centroid)
+
     # create all the control points of spline
     spline.points.add(len(verts)-1)
-    for num in range(len(verts)):
-        x, y, z = verts[num]
-        spline.points[num].co = (x, y, z, 1)  # we just use weighting of 1 here
+    # the points' coordinates are (x, y, z, w), and we just use weighting of
+    # 1 here.  They're all set in one go from a flat buffer.
+    co = np.empty((len(verts), 4), dtype=np.float32)
+    co[:, :3] = verts - centroid
+    co[:, 3] = 1.0
+    spline.points.foreach_set('co', co.ravel())
 
     # this must be after creating points since the funny things happen when
     # you mess with these properties before having control points
     if spline_type == 'NURBS':
         # make NURBS spline go right to the first and last vertices
         spline.use_endpoint_u = True
-        # set preview resolution to minimum
-        curve_data.resolution_u = 1
+        # set preview resolution to minimum.  If it's going to be converted
+        # to a mesh though, we need the full resolution, since it'll be
+        # converted at a low res otherwise
+        curve_data.resolution_u = res_length if auto_color else 1
         curve_data.render_resolution_u = res_length
         # The default Order is 4 so I don't change spline.order_u
 
-    # select only our tube and set to active object
-    for obj in bpy.context.selected_objects:
-        obj.select = False
-    scn.objects.active = curve
-    curve.select = True
-
-    bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS')
-
-    # In order to use the auto color, we have to convert the curve to a mesh
-    if auto_color:
-        # We convert it to a mesh, but first we need to set
-        # the resolution_u back up
-        # since it'll be converted at a low res otherwise
-        if spline_type == 'NURBS':
-            curve_data.resolution_u = curve_data.render_resolution_u
-        bpy.ops.object.convert(target='MESH')
-        # sometimes this conversion results in a bunch of doubles,
-        # so I remove the doubles
-        remove_doubles(curve)
-
-        curve.active_material.use_vertex_color_paint = True
-
-        # color the curve
-        color_tube(curve)
-
     return curve
 # end of make_curve(.)
 